@@ -1,118 +1,339 @@
-from datetime import datetime
-from collections import UserDict
+from datetime import date, datetime, timedelta
+from collections import UserDict, defaultdict
 import pickle
+import io
+import mmap
+import os
+import sys
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from tabulate import tabulate
 
+_DIGITS_TABLE = str.maketrans("", "", "0123456789") # Видаляє цифри: якщо після translate щось лишилось, номер невалідний
+
+_book_cache = None # Завантажена адресна книга для ботів, оновлюється при save_data
+
+LOG_COMPACT_THRESHOLD = 100 # Після стількох записів у журналі робимо новий знімок книги
+# Журнал відкривається як дескриптор для дозапису; O_DSYNC (де є) робить кожен запис одразу надійним
+_LOG_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_DSYNC", 0) | getattr(os, "O_BINARY", 0)
+_log_fds = {} # Шлях до журналу -> відкритий дескриптор
+_log_entries = {} # Шлях до журналу -> кількість записів після останнього знімка
+
+def _log_filename(filename): # Журнал лежить поруч зі знімком: addressbook.pkl -> addressbook.log
+    return os.path.abspath(os.path.splitext(filename)[0] + ".log")
+
+def _fsync_dir(filename): # Фіксує на диску запис каталогу після os.replace (на Windows каталог так не відкрити)
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 def save_data(book, filename = "addressbook.pkl"):
-    with open(filename, "wb") as f:
-        pickle.dump(book, f)
+    global _book_cache
+    tmp_filename = filename + ".tmp"
+    data = pickle.dumps(book, protocol=pickle.HIGHEST_PROTOCOL) # Серіалізація в пам'яті, на диск - один запис
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+    _fsync_dir(filename) # Журнал можна очищати лише коли новий знімок точно на диску
+    _book_cache = book
+    book._dirty = False
+    # Знімок уже містить усі зміни з журналу, тому журнал можна очистити
+    log_filename = _log_filename(filename)
+    fd = _log_fds.pop(log_filename, None)
+    if fd is not None:
+        os.close(fd)
+    open(log_filename, "wb").close()
+    _log_entries[log_filename] = 0
 
 def load_data(filename="addressbook.pkl"):
+    book = None
     try:
         with open(filename, "rb") as f:
-            return pickle.load(f)
+            size = os.fstat(f.fileno()).st_size
+            if size: # Порожній файл не можна відобразити в пам'ять - вважаємо його відсутнім
+                m = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+                try:
+                    book = pickle.loads(m)
+                finally:
+                    m.close()
+    except FileNotFoundError:
+        pass
+    if book is None:
+        book = AddressBook()  # Повернення нової адресної книги, якщо файл не знайдено
+    book._dirty = False
+    log_filename = _log_filename(filename)
+    _log_entries[log_filename] = replay_log(book, log_filename)
+    if _log_entries[log_filename]:
+        book._dirty = True # Зміни з журналу ще не потрапили у знімок
+    return book
+
+def append_log(command, args, filename="addressbook.pkl"): # Дозапис команди, що змінює книгу; повертає розмір журналу
+    log_filename = _log_filename(filename)
+    fd = _log_fds.get(log_filename)
+    if fd is None:
+        fd = _log_fds[log_filename] = os.open(log_filename, _LOG_FLAGS, 0o666)
+    os.write(fd, pickle.dumps((command, args), protocol=pickle.HIGHEST_PROTOCOL))
+    _log_entries[log_filename] = _log_entries.get(log_filename, 0) + 1
+    return _log_entries[log_filename]
+
+def replay_log(book, log_filename): # Повторне виконання команд із журналу після останнього знімка
+    count = 0
+    try:
+        with open(log_filename, "rb") as f:
+            log = io.BytesIO(f.read()) # Журнал читається одним викликом, розбір іде з пам'яті
     except FileNotFoundError:
-        return AddressBook()  # Повернення нової адресної книги, якщо файл не знайдено
+        return count
+    while True:
+        try:
+            entry = pickle.load(log)
+        except Exception:
+            break  # Кінець журналу, недописаний або пошкоджений запис - далі не читаємо
+        if not (isinstance(entry, tuple) and len(entry) == 2 and isinstance(entry[0], str) and entry[0] in LOGGED_COMMANDS):
+            continue  # Невідомий або пошкоджений запис пропускаємо
+        command, args = entry
+        changes = book._changes
+        HANDLERS[command](args, book)
+        if book._changes != changes:
+            count += 1
+    return count
+
+def log_command(command, args, book, filename="addressbook.pkl"):
+    if append_log(command, args, filename) >= LOG_COMPACT_THRESHOLD:
+        save_data(book, filename)
+
+def _get_book():
+    global _book_cache
+    if _book_cache is None:
+        _book_cache = load_data()
+    return _book_cache
 
 class Field: # Базовий клас для полів запису.
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
+    def __setstate__(self, state):
+        if isinstance(state, tuple): # Стан зі слотами: (None, {слот: значення})
+            state = state[1]
+        for key, value in state.items(): # Книги, збережені до появи __slots__, мають звичайний dict
+            setattr(self, key, value)
+
     def __str__(self):
         return str(self.value)
 
 class Name(Field): # Клас для зберігання імені контакту. Обов'язкове поле.
+    __slots__ = ()
+
     def __init__(self, name):
         if not name:
             raise ValueError("Name must not be empty.")
         super().__init__(name)
 
 class Phone(Field): # Клас для зберігання номера телефону. Має валідацію формату (10 цифр).
+    __slots__ = ()
+
     def __init__(self, phone):
-        if not phone.isdigit() or len(phone) != 10:
+        if len(phone) != 10 or phone.translate(_DIGITS_TABLE):
             raise ValueError("Phone number must have 10 digits.")
         super().__init__(phone)
 
+@lru_cache(maxsize=1024)
+def _parse_birthday(value: str) -> date: # strptime повільний, а дати при імпорті часто повторюються
+    return datetime.strptime(value, "%d.%m.%Y").date()
+
 class Birthday(Field):
+    __slots__ = ('_str',)
+
     def __init__(self, value):
         try:
-            self.value = datetime.strptime(value, "%d.%m.%Y").date()
+            self.value = _parse_birthday(value)
         except ValueError:
             raise ValueError("Invalid date format. Use DD.MM.YYYY")
+        self._str = self.value.strftime("%d.%m.%Y") # Дата незмінна, тож форматуємо один раз
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._str = self.value.strftime("%d.%m.%Y")
+
+    def __str__(self):
+        return self._str
 
 class Record: # Клас для зберігання інформації про контакт, включаючи ім'я та список телефонів.
+    __slots__ = ('name', 'phones', 'birthday', '_phone_index', '_str_cache', '_phones_cache', '_book')
+
     def __init__(self, name):
         self.name = Name(name)
         self.phones = []
         self.birthday = None
+        self._phone_index: dict[str, Phone] = {} # Індекс телефонів за номером для пошуку за O(1)
+        self._str_cache: str | None = None # Кеш рядкового подання, скидається при зміні запису
+        self._phones_cache: str | None = None
+        self._book = None # Книга, що містить запис; їй повідомляється про кожну зміну
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple): # Стан зі слотами: (None, {слот: значення})
+            state = state[1]
+        self._str_cache = self._phones_cache = self._book = None
+        for key, value in state.items(): # Записи, збережені до появи __slots__, мають звичайний dict
+            setattr(self, key, value)
+        if "_phone_index" not in state:
+            self._phone_index = {ph.value: ph for ph in self.phones}
+
+    def _changed(self): # Скидає кеші та позначає книгу зміненою
+        self._str_cache = self._phones_cache = None
+        if self._book is not None:
+            self._book._mark_changed()
 
     def add_birthday(self, birthday):
+        old_birthday = self.birthday
         self.birthday = Birthday(birthday)
+        self._str_cache = None
+        if self._book is not None:
+            self._book._birthday_changed(self, old_birthday)
 
     def add_phone(self, phone):
-        self.phones.append(Phone(phone))
+        ph = Phone(phone)
+        if ph.value in self._phone_index:
+            raise ValueError("Phone number already exists.")
+        self.phones.append(ph)
+        self._phone_index[ph.value] = ph
+        self._changed()
 
     def remove_phone(self, phone):
-        for ph in self.phones:
-            if ph.value == phone:
-                self.phones.remove(ph)
-
-    def edit_phone(self, old_phone, new_phone):
-        phone_exists = True
-        for p in self.phones:
-            if p.value == old_phone:
-                phone_exists = False
+        ph = self._phone_index.pop(phone, None)
+        if ph is None:
+            return
+        for i, p in enumerate(self.phones):
+            if p is ph:
+                self.phones.pop(i)
                 break
+        self._changed()
 
-        if phone_exists:
+    def edit_phone(self, old_phone, new_phone):
+        if old_phone not in self._phone_index:
             raise ValueError("Phone number to edit does not exist.")
 
-        if not new_phone.isdigit() or len(new_phone) != 10:
+        if len(new_phone) != 10 or new_phone.translate(_DIGITS_TABLE):
             raise ValueError("New phone number must be a 10-digit number.")
 
-        for ph in self.phones:
-            if ph.value == old_phone:
-                ph.value = new_phone
+        if new_phone != old_phone and new_phone in self._phone_index:
+            raise ValueError("New phone number already exists.")
+
+        ph = self._phone_index.pop(old_phone)
+        ph.value = new_phone
+        self._phone_index[new_phone] = ph
+        self._changed()
 
     def find_phone(self, phone):
-        for ph in self.phones:
-            if ph.value == phone:
-                return ph
-        return None
+        return self._phone_index.get(phone)
+
+    def phones_str(self):
+        if self._phones_cache is None:
+            self._phones_cache = '; '.join([p.value for p in self.phones])
+        return self._phones_cache
 
     def __str__(self):
-        birthday_str = str(self.birthday.value.strftime("%d.%m.%Y")) if self.birthday else 'Not specified'
-        return f"Contact name: {self.name.value}, phones: {'; '.join(p.value for p in self.phones)}, birthday: {birthday_str}"
+        if self._str_cache is None:
+            birthday_str = str(self.birthday) if self.birthday else 'Not specified'
+            self._str_cache = f"Contact name: {self.name.value}, phones: {self.phones_str()}, birthday: {birthday_str}"
+        return self._str_cache
 
 class AddressBook(UserDict): # Клас для зберігання та управління записами.
+    def __init__(self, dict=None, /, **kwargs):
+        self._bday_index = defaultdict(list) # (місяць, день) -> записи
+        self._changes = 0 # Лічильник змін: за ним main визначає, чи команда щось змінила
+        super().__init__(dict, **kwargs)
+        self._dirty = False # Чи змінювалась книга після останнього збереження
+
+    def __setstate__(self, state):
+        self._changes = 0
+        self.__dict__.update(state)
+        if "_bday_index" not in state: # Книга збережена до появи індексу - будуємо його
+            self._bday_index = defaultdict(list)
+            for record in self.data.values():
+                record._book = self
+                self._index_birthday(record)
+
+    def copy(self): # Копія з власним індексом; записи лишаються прив'язаними до початкової книги
+        new_book = type(self).__new__(type(self))
+        new_book.__dict__.update(self.__dict__)
+        new_book.data = self.data.copy()
+        new_book._bday_index = defaultdict(list, {key: records.copy() for key, records in self._bday_index.items()})
+        return new_book
+
+    __copy__ = copy
+
+    def __setitem__(self, name, record):
+        old_record = self.data.get(name)
+        if old_record:
+            self._unindex_birthday(old_record, old_record.birthday)
+            old_record._book = None
+        self.data[name] = record
+        record._book = self
+        self._index_birthday(record)
+        self._mark_changed()
+
+    def __delitem__(self, name):
+        record = self.data.pop(name)
+        self._unindex_birthday(record, record.birthday)
+        record._book = None
+        self._mark_changed()
+
+    def _index_birthday(self, record):
+        if record.birthday:
+            self._bday_index[(record.birthday.value.month, record.birthday.value.day)].append(record)
+
+    def _unindex_birthday(self, record, birthday):
+        if birthday:
+            key = (birthday.value.month, birthday.value.day)
+            self._bday_index[key].remove(record)
+            if not self._bday_index[key]:
+                del self._bday_index[key]
+
+    def _mark_changed(self):
+        self._dirty = True
+        self._changes += 1
+
+    def _birthday_changed(self, record, old_birthday): # Викликається з Record.add_birthday
+        self._unindex_birthday(record, old_birthday)
+        self._index_birthday(record)
+        self._mark_changed()
+
     def add_record(self, record):
-        self.data[record.name.value] = record
+        self[record.name.value] = record
 
     def find(self, name):
         return self.data.get(name)
 
+    def find_many(self, names): # Пошук кількох контактів за один прохід; відсутні імена пропускаються
+        data = self.data
+        return {name: data[name] for name in names if name in data}
+
     def delete(self, name):
         self.name = name
         if name in self.data:
-            del self.data[name]
+            del self[name]
 
     def get_upcoming_birthdays(self):
-        today = datetime.today().date()
-        upcoming_birthdays = []
-        for user in self.data.values():
-            if user.birthday:
-                birthday_this_year = datetime(today.year, user.birthday.value.month, user.birthday.value.day).date()
-                if birthday_this_year < today:
-                    continue
-                elif (birthday_this_year - today).days < 7:
-                    if birthday_this_year.weekday() == 5: # Saturday
-                        birthday_this_year = datetime(birthday_this_year.year, birthday_this_year.month, birthday_this_year.day + 2).date() # Changing the day to Monday
-                    elif birthday_this_year.weekday() == 6: # Sunday
-                        birthday_this_year = datetime(birthday_this_year.year, birthday_this_year.month, birthday_this_year.day + 1).date() # Changing the day to Monday
-                    user_info = {"name": user.name.value, "congratulation_date": birthday_this_year.strftime("%d.%m.%Y")}
-                    upcoming_birthdays.append(user_info)
-        return upcoming_birthdays
+        today = date.today()
+        for i in range(7):
+            day = today + timedelta(days=i)
+            users = self._bday_index.get((day.month, day.day))
+            if not users:
+                continue
+            weekday = day.weekday()
+            if weekday >= 5: # Saturday or Sunday
+                day += timedelta(days=2 if weekday == 5 else 1) # Changing the day to Monday
+            congratulation_date = day.strftime("%d.%m.%Y")
+            for user in users:
+                yield {"name": user.name.value, "congratulation_date": congratulation_date}
 
 def input_error(func): # Function - decorator for errors handling
     def inner(*args, **kwargs):
@@ -128,8 +349,47 @@ def input_error(func): # Function - decorator for errors handling
             return f"Error: {e}"
     return inner
 
+def hello(args, book):
+    return "How can I help you?"
+
+@input_error
+def add_contact(args, book):
+    if len(args) != 2:
+        return "Invalid number of arguments."
+    name, phone = args
+    record = Record(name)
+    record.add_phone(phone)
+    book.add_record(record)
+    return f"Added new contact: {name} - {phone}"
+
+@input_error
+def change_contact(args, book):
+    if len(args) != 2:
+        return "Invalid number of arguments."
+    name, new_phone = args
+    record = book.find(name)
+    if record:
+        record.edit_phone(record.phones[0].value, new_phone)
+        return f"Phone number changed for {name}."
+    return f"Contact {name} not found."
+
+@input_error
+def show_phone(args, book):
+    if len(args) != 1:
+        return "Invalid number of arguments."
+    name = args[0]
+    record = book.find(name)
+    if record:
+        return f"Phone number for {name}: {record.phones[0]}"
+    return f"Contact {name} not found."
+
+def show_all(args, book):
+    return "\n".join(["All contacts:", *(str(record) for record in book.data.values())])
+
 @input_error
 def add_birthday(args, book):
+    if len(args) != 2:
+        return "Invalid number of arguments."
     name, birthday = args
     try:
         record = book.find(name)
@@ -143,6 +403,8 @@ def add_birthday(args, book):
 
 @input_error
 def show_birthday(args, book):
+    if len(args) != 1:
+        return "Invalid number of arguments."
     name = args[0]
     record = book.find(name)
     if record and record.birthday:
@@ -154,13 +416,10 @@ def show_birthday(args, book):
 
 @input_error
 def birthdays(args, book):
-    upcoming_birthdays = book.get_upcoming_birthdays()
+    upcoming_birthdays = "\n".join(f"The congratulation date for {record['name']} is {record['congratulation_date']}" for record in book.get_upcoming_birthdays())
     if upcoming_birthdays:
-        print("Upcoming birthdays:")
-        for record in upcoming_birthdays:
-            return f"The congratulation date for {record['name']} is {record['congratulation_date']}"
-    else:
-        return "No upcoming birthdays."
+        return f"Upcoming birthdays:\n{upcoming_birthdays}"
+    return "No upcoming birthdays."
 
 def parse_input(user_input): # Parse input function
     cmd, *args = user_input.split()
@@ -178,8 +437,9 @@ class Bot(ABC):
     
 class SimpleBot(Bot):
     def return_all(self):
-        for record in load_data().data.values():
-            print(record)
+        contacts = "\n".join([str(record) for record in _get_book().data.values()])
+        if contacts:
+            sys.stdout.write(contacts + "\n")
     
     def return_help(self):
         print("add [name] [phone] - Add new contact")
@@ -195,9 +455,13 @@ class SimpleBot(Bot):
 
 class TableBot(Bot):
     def return_all(self):
-        record = load_data().data.values()
+        records = _get_book().data.values()
         headers = ["Name", "Phones", "Birhday"]
-        contact_data = [[contact.name.value, "; ".join(phone.value for phone in contact.phones), contact.birthday.value.strftime("%d.%m.%Y") if contact.birthday else "Not specified"] for contact in record]
+        contact_data = []
+        append = contact_data.append
+        for contact in records:
+            birthday = contact.birthday
+            append([contact.name.value, contact.phones_str(), str(birthday) if birthday else "Not specified"])
         return tabulate(contact_data, headers=headers, tablefmt="pretty")
     
     def return_help(self):
@@ -214,6 +478,21 @@ class TableBot(Bot):
         ]
         return (tabulate(menu, headers=["Command", "Description"]))
 
+EXIT_COMMANDS = {"close", "exit"}
+
+LOGGED_COMMANDS = {"add", "change", "add-birthday"} # Команди, що змінюють книгу і пишуться в журнал
+
+HANDLERS = { # Команда -> обробник(args, book), що повертає відповідь бота
+    "hello": hello,
+    "add": add_contact,
+    "change": change_contact,
+    "phone": show_phone,
+    "all": show_all,
+    "add-birthday": add_birthday,
+    "show-birthday": show_birthday,
+    "birthdays": birthdays,
+}
+
 # Main function
 def main():
     book = load_data()
@@ -222,69 +501,20 @@ def main():
         user_input = input("Enter a command: ")
         command, *args = parse_input(user_input)
 
-        if command in ["close", "exit"]:
+        if command in EXIT_COMMANDS:
             print("Good bye!")
             break
 
-        elif command == "hello":
-            print("How can I help you?")
-
-        elif command == "add":
-            if len(args) != 2:
-                print("Invalid number of arguments.")
-                continue
-            name, phone,  = args
-            record = Record(name)
-            record.add_phone(phone)
-            book.add_record(record)
-            print(f"Added new contact: {name} - {phone}")
-
-        elif command == "change":
-            if len(args) != 2:
-                print("Invalid number of arguments.")
-                continue
-            name, new_phone = args
-            record = book.find(name)
-            if record:
-                record.edit_phone(record.phones[0].value, new_phone)
-                print(f"Phone number changed for {name}.")
-            else:
-                print(f"Contact {name} not found.")
-
-        elif command == "phone":
-            if len(args) != 1:
-                print("Invalid number of arguments.")
-                continue
-            name = args[0]
-            record = book.find(name)
-            if record:
-                print(f"Phone number for {name}: {record.phones[0]}")
-            else:
-                print(f"Contact {name} not found.")
-
-        elif command == "all":
-            print("All contacts:")
-            for record in book.data.values():
-                print(record)
-
-        elif command == "add-birthday":
-            if len(args) != 2:
-                print("Invalid number of arguments.")
-                continue
-            print(add_birthday(args, book)) 
-
-        elif command == "show-birthday":
-            if len(args) != 1:
-                print("Invalid number of arguments.")
-                continue
-            print(show_birthday(args, book))
-
-        elif command == "birthdays":
-            print(birthdays(args, book))
-
-        else:
+        handler = HANDLERS.get(command)
+        if handler is None:
             print("Invalid command.")
-    save_data(book)
+        else:
+            changes = book._changes
+            print(handler(args, book))
+            if command in LOGGED_COMMANDS and book._changes != changes: # Пишемо в журнал лише фактичні зміни
+                log_command(command, args, book)
+    if book._dirty:
+        save_data(book)
     
 '''
     bot = SimpleBot()
@@ -0,0 +1,94 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+import SE_HW_1_2
+from SE_HW_1_2 import Record, add_contact, load_data, log_command, main
+
+
+class RemovePhoneTest(unittest.TestCase):
+    def test_str_changes_after_remove(self):
+        for removed, kept in (("1111111111", "2222222222"), ("2222222222", "1111111111")):
+            record = Record("Bob")
+            record.add_phone("1111111111")
+            record.add_phone("2222222222")
+            before = str(record)
+            record.remove_phone(removed)
+            self.assertNotEqual(str(record), before)
+            self.assertEqual(str(record), f"Contact name: Bob, phones: {kept}, birthday: Not specified")
+            self.assertIsNone(record.find_phone(removed))
+
+    def test_remove_only_phone(self):
+        record = Record("Bob")
+        record.add_phone("1111111111")
+        str(record)
+        record.remove_phone("1111111111")
+        self.assertEqual(str(record), "Contact name: Bob, phones: , birthday: Not specified")
+        self.assertEqual(record.phones, [])
+
+
+class CommandLogTest(unittest.TestCase):
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        for fd in SE_HW_1_2._log_fds.values():
+            os.close(fd)
+        SE_HW_1_2._log_fds.clear()
+        SE_HW_1_2._log_entries.clear()
+        SE_HW_1_2._book_cache = None
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def run_main(self, *commands):
+        with mock.patch("builtins.input", side_effect=[*commands, "exit"]), mock.patch("builtins.print"):
+            main()
+
+    def test_replay_restores_unsaved_changes(self):
+        book = load_data()
+        log_command("add", ["Bob", "1234567890"], book)
+        log_command("add-birthday", ["Bob", "01.02.1990"], book)
+        log_command("change", ["Bob", "1111111111"], book)
+        book = load_data()
+        self.assertEqual(str(book.find("Bob")), "Contact name: Bob, phones: 1111111111, birthday: 01.02.1990")
+        self.assertTrue(book._dirty)
+
+    def test_truncated_tail_is_ignored(self):
+        entry = pickle.dumps(("add", ["Bob", "1234567890"]))
+        with open("addressbook.log", "wb") as f:
+            f.write(entry + pickle.dumps(("add", ["Ann", "1111111111"]))[:-3])
+        book = load_data()
+        self.assertEqual(list(book.data), ["Bob"])
+
+    def test_corrupt_log_does_not_crash_load(self):
+        with open("addressbook.log", "wb") as f:
+            f.write(b"garbage\n")
+        book = load_data()
+        self.assertEqual(len(book), 0)
+        self.assertFalse(book._dirty)
+
+    def test_log_is_compacted_at_threshold(self):
+        book = load_data()
+        with mock.patch.object(SE_HW_1_2, "LOG_COMPACT_THRESHOLD", 3):
+            for i in range(3):
+                args = [f"User{i}", f"000000000{i}"]
+                add_contact(args, book)
+                log_command("add", args, book)
+        self.assertEqual(os.path.getsize("addressbook.log"), 0)
+        self.assertEqual(len(load_data()), 3)
+
+    def test_failed_commands_are_not_logged(self):
+        self.run_main("add Bob 1234567890")
+        self.run_main("add Ann abc", "change Nobody 1111111111", "add-birthday Bob 99.99.9999")
+        self.assertEqual(os.path.getsize("addressbook.log"), 0)
+        modified = os.stat("addressbook.pkl").st_mtime_ns
+        self.run_main("all")
+        self.assertEqual(os.stat("addressbook.pkl").st_mtime_ns, modified)
+
+
+if __name__ == "__main__":
+    unittest.main()